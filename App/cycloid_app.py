@@ -10,20 +10,30 @@
 #
 # NOTE: SolidWorks can choke if t range is exactly 0..2*pi. Use 2*pi - eps.
 
+import functools
+import io
 import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 
 import numpy as np
-import matplotlib.pyplot as plt
+import plotly.graph_objects as go
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; the NumPy path is the fallback.
+    njit = None
 
 
 # ----------------------------
 # SECTION A: Parameters + Maths
 # ----------------------------
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Params:
     # Core rotor inputs (mm)
     R: float      # rotor radius (roller pitch circle radius)
@@ -45,6 +55,13 @@ class Params:
     samples: int
     eps: float  # radians
 
+    @property
+    def phase2_rad(self) -> float:
+        # Plain property: slots=True rules out cached_property, and the
+        # conversion is one multiply — the point is that only dual-disc
+        # code paths ever evaluate it.
+        return math.radians(self.disc2_phase_deg)
+
 
 def gear_ratio_N_to_Nminus1(N: int) -> float:
     # Common single-disc cycloidal reducer: lobes = N-1 gives ratio ~ (N-1):1 (architecture dependent)
@@ -54,6 +71,54 @@ def gear_ratio_N_to_Nminus1(N: int) -> float:
     return (N - 1) / 1.0
 
 
+if njit is not None:
+    @functools.lru_cache(maxsize=64)
+    def _profile_kernel_for(N: int):
+        # N is baked into the kernel as a closure constant, so LLVM can
+        # constant-fold the (1-N) and N multiplies. Compiled once per
+        # distinct N (the lru_cache holds the dispatcher, Numba's cache=True
+        # persists the machine code across sessions).
+        @njit(cache=True, fastmath=True)
+        def kernel(t, R, Rr, E, phase_rad, x, y):
+            # One fused loop, zero temporaries, two sincos pairs per element.
+            # cos/sin(tt + psi) come from the angle-addition identity with
+            # cos/sin(psi) = (denom, sin a)/hypot, so psi itself (atan2 + a
+            # trig pair) is never evaluated; cos/sin(N*tt) likewise fall out
+            # of the same two pairs because N*tt = tt - a. sin/cos of the
+            # same argument sit adjacent so LLVM can emit a fused sincos.
+            for i in range(t.size):
+                tt = t[i] + phase_rad
+                a = (1 - N) * tt
+                sa = math.sin(a)
+                ca = math.cos(a)
+                denom = (R / (E * N)) - ca
+                h = math.hypot(sa, denom)
+                if h > 0.0:
+                    cos_psi = denom / h
+                    sin_psi = sa / h
+                else:
+                    # E == R/N (max eccentricity) puts (sa, denom) at the
+                    # origin where a ≡ 0; arctan2(0, 0) is 0 there.
+                    cos_psi = 1.0
+                    sin_psi = 0.0
+                c = math.cos(tt)
+                s = math.sin(tt)
+                x[i] = R*c - Rr*(c*cos_psi - s*sin_psi) - E*(c*ca + s*sa)
+                y[i] = -R*s + Rr*(s*cos_psi + c*sin_psi) + E*(s*ca - c*sa)
+        return kernel
+
+    # Warm the JIT for the default N at import so a cold Streamlit start
+    # doesn't pay the compile latency on the first slider interaction.
+    # Numba specializes on dtype *and* mutability, and real calls always get
+    # the read-only grid from _t_array (float32 preview, float64 export), so
+    # warm exactly those two signatures.
+    for _dt in ("float32", "float64"):
+        _warm = np.linspace(0.0, 1.0, 8, dtype=_dt)
+        _warm.setflags(write=False)
+        _profile_kernel_for(10)(_warm, 20.0, 3.0, 1.1, 0.0,
+                                np.empty_like(_warm), np.empty_like(_warm))
+
+
 def cycloid_profile_xy(t: np.ndarray, R: float, Rr: float, E: float, N: int, phase_rad: float = 0.0) -> tuple[np.ndarray, np.ndarray]:
     """
     Rotor profile point generation using the same structure as the Younis app equations.
@@ -61,23 +126,100 @@ def cycloid_profile_xy(t: np.ndarray, R: float, Rr: float, E: float, N: int, pha
 
     If you want to emulate the "fit check" from Younis preview, add +E to X to offset the disc.
     Here we keep it centred at origin and let you overlay rollers separately.
+
+    Dispatches to the fused Numba kernel when available; otherwise runs the
+    in-place NumPy version (buffers allocated once, reused via out= /
+    augmented assignment, instead of chaining ~8 full-size temporaries).
+    Output dtype follows t: the preview passes float32, export float64.
     """
+    if njit is not None:
+        x = np.empty_like(t)
+        y = np.empty_like(t)
+        _profile_kernel_for(N)(t, R, Rr, E, phase_rad, x, y)
+        return x, y
+
     tt = t + phase_rad
     a = (1 - N) * tt
-    denom = (R / (E * N)) - np.cos(a)
-    psi = np.arctan2(np.sin(a), denom)
-
-    x = (R * np.cos(tt)) - (Rr * np.cos(tt + psi)) - (E * np.cos(N * tt))
-    y = (-R * np.sin(tt)) + (Rr * np.sin(tt + psi)) + (E * np.sin(N * tt))
+    sa = np.sin(a)
+    ca = np.cos(a, out=a)
+    denom = R / (E * N) - ca
+
+    # cos/sin(psi) directly from (denom, sin a)/hypot — no arctan2; the
+    # angle-addition identities below replace both the cos/sin(tt + psi)
+    # pair and the cos/sin(N*tt) pair (N*tt = tt - a), leaving just two
+    # sincos passes over the array.
+    h = np.hypot(sa, denom)
+    zero = h == 0.0
+    if zero.any():
+        # E == R/N (max eccentricity) puts (sa, denom) at the origin where
+        # a ≡ 0; arctan2(0, 0) is 0 there, i.e. cos_psi = 1, sin_psi = 0.
+        h[zero] = 1.0
+        denom[zero] = 1.0
+    cos_psi = np.divide(denom, h, out=denom)
+    sin_psi = np.divide(sa, h, out=h)
+
+    cos_tt = np.cos(tt)
+    sin_tt = np.sin(tt)
+
+    cos_ttp = cos_tt * cos_psi
+    tmp = np.multiply(sin_tt, sin_psi, out=tt)
+    cos_ttp -= tmp
+    np.multiply(cos_tt, sin_psi, out=sin_psi)
+    sin_ttp = np.multiply(sin_tt, cos_psi, out=cos_psi)
+    sin_ttp += sin_psi
+
+    cos_Ntt = np.multiply(cos_tt, ca, out=sin_psi)
+    np.multiply(sin_tt, sa, out=tmp)
+    cos_Ntt += tmp
+    sin_Ntt = np.multiply(sin_tt, ca, out=ca)
+    np.multiply(cos_tt, sa, out=sa)
+    sin_Ntt -= sa
+
+    x = np.multiply(cos_tt, R, out=cos_tt)
+    cos_ttp *= Rr
+    x -= cos_ttp
+    cos_Ntt *= E
+    x -= cos_Ntt
+
+    y = np.multiply(sin_tt, -R, out=sin_tt)
+    sin_ttp *= Rr
+    y += sin_ttp
+    sin_Ntt *= E
+    y += sin_Ntt
     return x, y
 
 
+@st.cache_resource
+def _t_array(samples: int, eps: float, dtype: str = "float64") -> np.ndarray:
+    """Memoized sample grid. cache_resource (not cache_data) so every caller
+    shares one allocation instead of getting a pickled copy; the array is
+    marked read-only so downstream in-place ops can't corrupt the cache."""
+    t = np.linspace(0.0, (2.0 * math.pi) - eps, samples, endpoint=True, dtype=dtype)
+    t.setflags(write=False)
+    return t
+
+
+@st.cache_data
+def _profile_cached(R: float, Rr: float, E: float, N: int, samples: int, eps: float,
+                    phase_rad: float = 0.0, dtype: str = "float64") -> tuple[np.ndarray, np.ndarray]:
+    """Memoized profile generation, keyed on scalar parameters only.
+
+    Builds t internally so the cache key stays pure scalars (hashing a big
+    t array on every rerun would cost more than the lookup saves).
+    float32 is plenty for on-screen preview (halves memory traffic); CSV
+    export should keep the float64 default.
+    """
+    return cycloid_profile_xy(_t_array(samples, eps, dtype), R, Rr, E, N, phase_rad=phase_rad)
+
+
+@st.cache_data
 def roller_centres(R: float, N: int) -> np.ndarray:
     """Centres of rollers on pitch circle radius R."""
     ang = np.linspace(0, 2*np.pi, N, endpoint=False)
     return np.column_stack((R*np.cos(ang), R*np.sin(ang)))
 
 
+@st.cache_data
 def output_hole_centres(out_pin_circle_R: float, out_pin_count: int) -> np.ndarray:
     ang = np.linspace(0, 2*np.pi, out_pin_count, endpoint=False)
     return np.column_stack((out_pin_circle_R*np.cos(ang), out_pin_circle_R*np.sin(ang)))
@@ -87,6 +229,7 @@ def output_hole_centres(out_pin_circle_R: float, out_pin_count: int) -> np.ndarr
 # SECTION B: Exporters
 # ----------------------------
 
+@st.cache_data
 def solidworks_equations_text(p: Params) -> str:
     # Keep it maximally compatible: SolidWorks supports atan(), sin(), cos().
     # Use the classic “psi” definition (atan of fraction).
@@ -118,20 +261,20 @@ def solidworks_equations_text(p: Params) -> str:
     lines.append("")
     lines.append(f"Recommended t range: {t0} to {t1} (avoid exactly 2*pi)")
     if p.dual_disc:
-        phase = math.radians(p.disc2_phase_deg)
+        phase = p.phase2_rad
         lines.append("")
         lines.append("Optional: Disc 2 (phase shifted)")
         lines.append(f"Use t2 = t + {phase}  (or add {phase} everywhere t appears)")
     return "\n".join(lines)
 
 
+@st.cache_data
 def parameters_text(p: Params) -> str:
+    # Deterministic (no timestamp) so the output is stable across reruns and
+    # cacheable; the download path prepends the timestamp at click time.
     lobes = p.N - 1
     ratio_hint = gear_ratio_N_to_Nminus1(p.N)
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     lines = []
-    lines.append(f"Generated: {ts}")
-    lines.append("")
     lines.append("Core rotor parameters (mm unless stated):")
     lines.append(f"N (rollers)            = {p.N}")
     lines.append(f"Lobes (N-1)             = {lobes}")
@@ -156,11 +299,26 @@ def parameters_text(p: Params) -> str:
     return "\n".join(lines)
 
 
-def csv_points(x: np.ndarray, y: np.ndarray) -> str:
-    out = ["x_mm,y_mm"]
-    for xi, yi in zip(x, y):
-        out.append(f"{xi:.6f},{yi:.6f}")
-    return "\n".join(out)
+def parameters_text_with_ts(p: Params) -> str:
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return f"Generated: {ts}\n\n{parameters_text(p)}"
+
+
+def csv_points_bytes(x: np.ndarray, y: np.ndarray) -> bytes:
+    # np.savetxt formats in C — much faster than a Python f-string per row.
+    # Writing into a BytesIO yields the download payload directly, without
+    # an intermediate str and the extra .encode("utf-8") copy.
+    buf = io.BytesIO()
+    buf.write(b"x_mm,y_mm\n")
+    np.savetxt(buf, np.column_stack((x, y)), fmt="%.6f", delimiter=",")
+    return buf.getvalue()
+
+
+@st.cache_data
+def _csv_points_cached(x_bytes: bytes, y_bytes: bytes) -> bytes:
+    """csv_points_bytes keyed on the raw array bytes, so repeat reruns over
+    the same points (e.g. download-button re-clicks) skip the formatting pass."""
+    return csv_points_bytes(np.frombuffer(x_bytes), np.frombuffer(y_bytes))
 
 
 # ----------------------------
@@ -191,7 +349,8 @@ with st.sidebar:
 
     st.divider()
     st.header("Sampling / SolidWorks stability")
-    samples = st.slider("Samples (preview + CSV)", min_value=200, max_value=6000, value=1200, step=100)
+    samples = st.slider("Samples (CSV export)", min_value=200, max_value=6000, value=1200, step=100,
+                        help="Preview always uses a fixed 600 points; this only sets CSV density.")
     eps = st.number_input("Epsilon (rad) for 2π", min_value=1e-6, value=9e-4, step=1e-4, format="%.6f")
 
 p = Params(
@@ -210,65 +369,84 @@ p = Params(
 )
 
 # Sanity checks
-warnings = []
-if p.E <= 0:
-    warnings.append("E must be > 0.")
-if p.E > (p.R / p.N):
-    warnings.append("E is larger than R/N. This often causes ugly/self-intersecting profiles. Not always invalid, but check fit.")
-if p.R <= p.Rr:
-    warnings.append("R should usually be larger than Rr (roller circle radius vs roller radius).")
-if warnings:
-    for w in warnings:
-        st.warning(w)
-
-# Generate profile points
-t = np.linspace(0.0, (2.0 * math.pi) - p.eps, p.samples, endpoint=True)
-x1, y1 = cycloid_profile_xy(t, p.R, p.Rr, p.E, p.N, phase_rad=0.0)
-
-phase2 = math.radians(p.disc2_phase_deg)
+def _compute_warnings(p: Params) -> tuple[str, ...]:
+    warnings = []
+    if p.E <= 0:
+        warnings.append("E must be > 0.")
+    if p.E > (p.R / p.N):
+        warnings.append("E is larger than R/N. This often causes ugly/self-intersecting profiles. Not always invalid, but check fit.")
+    if p.R <= p.Rr:
+        warnings.append("R should usually be larger than Rr (roller circle radius vs roller radius).")
+    return tuple(warnings)
+
+
+# Recompute only when the geometry inputs change; rendering from session_state
+# keeps the warning boxes stable across reruns that touch unrelated widgets.
+_warn_key = (p.R, p.Rr, p.E, p.N)
+if st.session_state.get("_warn_key") != _warn_key:
+    st.session_state["_warn_key"] = _warn_key
+    st.session_state["_warnings"] = _compute_warnings(p)
+for w in st.session_state["_warnings"]:
+    st.warning(w)
+
+# Generate preview points (memoized: reruns that only touch unrelated widgets
+# hit the cache). The preview uses a fixed low density — ~600 points is smooth
+# at screen resolution — while the dense user-chosen sampling runs on the CSV
+# worker pool in the exports section, off the script run's critical path.
+_PREVIEW_SAMPLES = 600
+
+x1, y1 = _profile_cached(p.R, p.Rr, p.E, p.N, _PREVIEW_SAMPLES, p.eps, phase_rad=0.0, dtype="float32")
+
 if p.dual_disc:
-    x2, y2 = cycloid_profile_xy(t, p.R, p.Rr, p.E, p.N, phase_rad=phase2)
+    x2, y2 = _profile_cached(p.R, p.Rr, p.E, p.N, _PREVIEW_SAMPLES, p.eps, phase_rad=p.phase2_rad, dtype="float32")
 else:
     x2, y2 = None, None
 
-# Build plot
-fig = plt.figure(figsize=(7, 7))
-ax = plt.gca()
+# Build plot. Plotly renders client-side: the server ships only the trace
+# data instead of rasterizing a PNG per rerun like st.pyplot. Rendering lives
+# in a fragment so widget interactions don't rerun the whole page.
+# The unit-circle sample tables are constants — hoisted to module scope so
+# reruns don't redo the trig passes for every circle group.
+_CIRCLE_N = 120
+_TH = np.linspace(0, 2*np.pi, _CIRCLE_N)
+_COS_TH = np.cos(_TH)
+_SIN_TH = np.sin(_TH)
+
+
+def circles_trace_xy(centres: np.ndarray, radii: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """NaN-separated circle polylines, one row per circle (ravel a row slice
+    to feed a Scatter trace). Takes per-circle radii so rollers and output
+    holes can be generated in one broadcast and sliced apart afterwards."""
+    nan_col = np.full((centres.shape[0], 1), np.nan)
+    cx = np.hstack((centres[:, 0, None] + radii[:, None]*_COS_TH[None, :], nan_col))
+    cy = np.hstack((centres[:, 1, None] + radii[:, None]*_SIN_TH[None, :], nan_col))
+    return cx, cy
+
+
+@st.fragment
+def render_preview(p: Params, x1: np.ndarray, y1: np.ndarray, x2, y2) -> None:
+    fig = go.Figure()
+    fig.add_scatter(x=x1, y=y1, mode="lines", name="Rotor (disc 1)")
+    if p.dual_disc:
+        fig.add_scatter(x=x2, y=y2, mode="lines", line=dict(dash="dash"), name="Rotor (disc 2)")
 
-# Rotor curve(s)
-ax.plot(x1, y1, linewidth=2, label="Rotor (disc 1)")
-if p.dual_disc:
-    ax.plot(x2, y2, linewidth=2, linestyle="--", label="Rotor (disc 2)")
-
-# Rollers
-centres = roller_centres(p.R, p.N)
-th = np.linspace(0, 2*np.pi, 120)
-for i, (cx, cy) in enumerate(centres):
-    rx = cx + p.Rr*np.cos(th)
-    ry = cy + p.Rr*np.sin(th)
-    if i == 0:
-        ax.plot(rx, ry, linewidth=1.5, label="Rollers")
-    else:
-        ax.plot(rx, ry, linewidth=1.5)
-
-# Output holes (as circles)
-hole_R = (p.out_pin_diam + p.hole_clearance) / 2.0
-out_centres = output_hole_centres(p.out_pin_circle_R, p.out_pin_count)
-for i, (cx, cy) in enumerate(out_centres):
-    hx = cx + hole_R*np.cos(th)
-    hy = cy + hole_R*np.sin(th)
-    if i == 0:
-        ax.plot(hx, hy, linewidth=1.5, label="Output holes")
-    else:
-        ax.plot(hx, hy, linewidth=1.5)
-
-ax.set_aspect("equal", adjustable="box")
-ax.set_xlabel("x (mm)")
-ax.set_ylabel("y (mm)")
-ax.grid(True, linewidth=0.5)
-ax.legend(loc="upper right")
-
-st.pyplot(fig, clear_figure=True)
+    # Rollers + output holes share the same parametric form, so build them in
+    # one (N+M, 120) broadcast and slice the result into the two traces.
+    hole_R = (p.out_pin_diam + p.hole_clearance) / 2.0
+    all_centres = np.vstack((roller_centres(p.R, p.N),
+                             output_hole_centres(p.out_pin_circle_R, p.out_pin_count)))
+    all_radii = np.concatenate((np.full(p.N, p.Rr), np.full(p.out_pin_count, hole_R)))
+    cx, cy = circles_trace_xy(all_centres, all_radii)
+    fig.add_scatter(x=cx[:p.N].ravel(), y=cy[:p.N].ravel(), mode="lines", name="Rollers")
+    fig.add_scatter(x=cx[p.N:].ravel(), y=cy[p.N:].ravel(), mode="lines", name="Output holes")
+
+    fig.update_yaxes(scaleanchor="x", scaleratio=1)
+    fig.update_layout(height=700, xaxis_title="x (mm)", yaxis_title="y (mm)",
+                      legend=dict(x=0.99, y=0.99, xanchor="right"))
+    st.plotly_chart(fig, width="stretch")
+
+
+render_preview(p, x1, y1, x2, y2)
 
 # Exports
 st.subheader("Exports")
@@ -279,20 +457,46 @@ st.text_area("SolidWorks equations (copy/paste)", value=eq_txt, height=220)
 par_txt = parameters_text(p)
 st.text_area("Parameter summary", value=par_txt, height=220)
 
-# CSVs (disc 1 always; disc 2 optional)
-csv1 = csv_points(x1, y1)
+# CSVs (disc 1 always; disc 2 optional). Dense CSV generation is submitted to
+# a small worker pool at rerun time, so it resolves behind user think-time
+# and never blocks the script run; the data callable just collects the
+# Future's result when the user actually clicks.
+def _disc_csv(p: Params, phase_rad: float) -> bytes:
+    x, y = _profile_cached(p.R, p.Rr, p.E, p.N, p.samples, p.eps, phase_rad=phase_rad)
+    return _csv_points_cached(x.tobytes(), y.tobytes())
+
+
+@st.cache_resource
+def _csv_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=2)
+
+
+def _submit_csv(p: Params, phase_rad: float):
+    # The st.cache_* calls inside _disc_csv log "missing ScriptRunContext"
+    # when run from a bare worker thread, so attach the current run's context
+    # to whichever pool thread picks the job up.
+    ctx = get_script_run_ctx()
+
+    def job() -> bytes:
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return _disc_csv(p, phase_rad)
+
+    return _csv_pool().submit(job)
+
+
+csv1_future = _submit_csv(p, 0.0)
 st.download_button(
     "Download Disc 1 points (CSV)",
-    data=csv1.encode("utf-8"),
+    data=lambda: csv1_future.result(),
     file_name=f"disc1_points_N{p.N}_R{p.R}_Rr{p.Rr}_E{p.E}.csv",
     mime="text/csv",
 )
 
 if p.dual_disc:
-    csv2 = csv_points(x2, y2)
+    csv2_future = _submit_csv(p, p.phase2_rad)
     st.download_button(
         "Download Disc 2 points (CSV)",
-        data=csv2.encode("utf-8"),
+        data=lambda: csv2_future.result(),
         file_name=f"disc2_points_N{p.N}_R{p.R}_Rr{p.Rr}_E{p.E}_phase{p.disc2_phase_deg}.csv",
         mime="text/csv",
     )
@@ -306,7 +510,7 @@ st.download_button(
 
 st.download_button(
     "Download parameters (TXT)",
-    data=par_txt.encode("utf-8"),
+    data=lambda: parameters_text_with_ts(p).encode("utf-8"),
     file_name=f"parameters_N{p.N}_R{p.R}_Rr{p.Rr}_E{p.E}.txt",
     mime="text/plain",
 )